@@ -19,6 +19,10 @@ if not (AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_EMBEDDIN
 BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_DIR = BASE_DIR / "uploads"
 CHROMA_DB_DIR = BASE_DIR / "chroma_db"
+EMBEDDING_CACHE_DIR = CHROMA_DB_DIR / "emb_cache"
+KEYWORD_INDEX_DB = CHROMA_DB_DIR / "keyword_index.sqlite3"
+FILE_INDEX_DB = CHROMA_DB_DIR / "file_index.sqlite3"
+WARMUP_QUERIES_FILE = BASE_DIR / "warmup_queries.txt"
 
 # Create necessary directories
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -27,7 +31,38 @@ CHROMA_DB_DIR.mkdir(exist_ok=True)
 # RAG Configuration
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+MIN_CHUNK_SIZE = int(os.getenv("MIN_CHUNK_SIZE", "100"))
 TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1000"))
+EMBEDDING_CACHE_QUANTIZE = os.getenv("EMBEDDING_CACHE_QUANTIZE", "true").lower() == "true"
+EMBEDDING_CACHE_FUZZY = os.getenv("EMBEDDING_CACHE_FUZZY", "false").lower() == "true"
+# Users with fewer chunks than this are searched with an in-memory index
+FAST_INDEX_MAX_VECTORS = int(os.getenv("FAST_INDEX_MAX_VECTORS", "5000"))
+# Maximum number of per-user in-memory indexes kept at once (least recently searched are evicted)
+FAST_INDEX_MAX_USERS = int(os.getenv("FAST_INDEX_MAX_USERS", "16"))
+FILE_INFO_CACHE_TTL = int(os.getenv("FILE_INFO_CACHE_TTL", "30"))
+# HNSW index parameters (only applied when the collection is first created)
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "200"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "100"))
+LOAD_DOCUMENTS_NUM_WORKERS = int(os.getenv("LOAD_DOCUMENTS_NUM_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Server Configuration
+# Chroma's embedded PersistentClient is not multi-process safe; only raise this
+# when CHROMA_SERVER_HOST points every worker at a shared Chroma server
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+# When set, connect to a Chroma server instead of the embedded database in CHROMA_DB_DIR
+CHROMA_SERVER_HOST = os.getenv("CHROMA_SERVER_HOST", "")
+CHROMA_SERVER_PORT = int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+# Per-process in-memory indexes and file info caches can't see other workers'
+# uploads and deletes, so they are disabled when running more than one worker
+if WEB_WORKERS > 1:
+    FAST_INDEX_MAX_VECTORS = 0
+    FILE_INFO_CACHE_TTL = 0
+# When set (e.g. "/internal/uploads/"), file content is served by nginx via X-Accel-Redirect
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "")
 
 # Allowed file types
 ALLOWED_EXTENSIONS = {
@@ -1,23 +1,31 @@
 from typing import List
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from semantic_text_splitter import TextSplitter
 from langchain_community.document_loaders import (
     PyPDFLoader,
     TextLoader,
     UnstructuredWordDocumentLoader,
 )
-from config import CHUNK_SIZE, CHUNK_OVERLAP, ALLOWED_EXTENSIONS
+from config import CHUNK_SIZE, CHUNK_OVERLAP, MIN_CHUNK_SIZE, ALLOWED_EXTENSIONS
 import logging
 
 logger = logging.getLogger(__name__)
 
+LOADERS = {
+    "pdf": PyPDFLoader,
+    "txt": TextLoader,
+    "doc": UnstructuredWordDocumentLoader,
+    "docx": UnstructuredWordDocumentLoader,
+}
+
+CHUNK_SEPARATOR = "\n\n"
+# Merged chunks larger than this are split again
+MAX_MERGED_CHUNK_SIZE = int(CHUNK_SIZE * 1.1)
+
 class DocumentProcessor:
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            length_function=len,
-        )
+        # Rust-backed splitter; capacity and overlap are measured in characters
+        self.text_splitter = TextSplitter(CHUNK_SIZE, overlap=CHUNK_OVERLAP)
 
     def get_loader(self, file_path: str):
         """Get the appropriate loader based on file extension."""
@@ -25,14 +33,40 @@ class DocumentProcessor:
         if ext not in ALLOWED_EXTENSIONS:
             raise ValueError(f"Unsupported file type: {ext}")
 
-        if ext == "pdf":
-            return PyPDFLoader(file_path)
-        elif ext == "txt":
-            return TextLoader(file_path)
-        elif ext in ["doc", "docx"]:
-            return UnstructuredWordDocumentLoader(file_path)
-        else:
+        loader_class = LOADERS.get(ext)
+        if loader_class is None:
             raise ValueError(f"No loader available for {ext}")
+        return loader_class(file_path)
+
+    def merge_chunks(self, chunks: List[str]) -> List[str]:
+        """Merge under-filled adjacent chunks so fewer chunks need embedding.
+
+        Adjacent chunks are combined while they fit in CHUNK_SIZE, chunks still
+        below MIN_CHUNK_SIZE are folded into a neighbour, and anything that ends
+        up larger than MAX_MERGED_CHUNK_SIZE is split again.
+        """
+        merged = []
+        for chunk in chunks:
+            if merged and len(merged[-1]) + len(CHUNK_SEPARATOR) + len(chunk) <= CHUNK_SIZE:
+                merged[-1] += CHUNK_SEPARATOR + chunk
+            else:
+                merged.append(chunk)
+
+        # Fold tiny chunks into the previous chunk (or the next one for the first)
+        folded = []
+        for chunk in merged:
+            if folded and (len(chunk) < MIN_CHUNK_SIZE or len(folded[-1]) < MIN_CHUNK_SIZE):
+                folded[-1] += CHUNK_SEPARATOR + chunk
+            else:
+                folded.append(chunk)
+
+        result = []
+        for chunk in folded:
+            if len(chunk) > MAX_MERGED_CHUNK_SIZE:
+                result.extend(self.text_splitter.chunks(chunk))
+            else:
+                result.append(chunk)
+        return result
 
     def process_document(self, file_path: str) -> List[str]:
         """Process a document and return chunks of text."""
@@ -46,15 +80,34 @@ class DocumentProcessor:
             logger.info("Loading document with loader")
             documents = loader.load()
             logger.info(f"Document loaded, splitting into chunks")
-            chunks = self.text_splitter.split_documents(documents)
+            chunks = [
+                chunk
+                for document in documents
+                for chunk in self.text_splitter.chunks(document.page_content)
+            ]
             logger.info(f"Document split into {len(chunks)} chunks")
+            chunks = self.merge_chunks(chunks)
+            logger.info(f"Merged into {len(chunks)} chunks")
             
             # Verify file still exists after processing
             if not os.path.exists(file_path):
                 logger.error(f"File was deleted during processing: {file_path}")
                 raise Exception(f"File was deleted during processing: {file_path}")
                 
-            return [chunk.page_content for chunk in chunks]
+            return chunks
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
-            raise Exception(f"Error processing document: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error processing document: {str(e)}")
+
+_worker_processor = None
+
+def process_document_in_worker(file_path: str) -> List[str]:
+    """Process a document with a per-process DocumentProcessor.
+
+    Used as the target for process pool workers so the processor is built
+    once per worker instead of being pickled for every file.
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor.process_document(file_path)
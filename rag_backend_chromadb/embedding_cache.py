@@ -0,0 +1,256 @@
+from typing import List, Dict, Optional, Tuple, Union
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import logging
+import diskcache
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def quantize(vector: List[float]) -> Tuple[bytes, float]:
+    """Linearly quantize a vector to int8 with a per-vector scale."""
+    v = np.asarray(vector, dtype=np.float32)
+    scale = float(np.abs(v).max()) / 127 or 1.0
+    q = np.clip(np.round(v / scale), -127, 127).astype(np.int8)
+    return q.tobytes(), scale
+
+def dequantize(entry: Tuple[bytes, float]) -> List[float]:
+    """Restore a float vector from quantize() output."""
+    data, scale = entry
+    return (np.frombuffer(data, dtype=np.int8).astype(np.float32) * scale).tolist()
+
+# SimHash fingerprints are split into 4 bands of 16 bits; two fingerprints within
+# Hamming distance 3 must agree on at least one band
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = 16
+SIMHASH_MAX_DISTANCE = 3
+
+def normalize_query(text: str) -> str:
+    """Lowercase, collapse whitespace and strip surrounding punctuation."""
+    return re.sub(r"\s+", " ", text.lower().strip(" .?!,\t\n"))
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over character trigrams."""
+    weights = [0] * 64
+    for i in range(max(1, len(text) - 2)):
+        h = int.from_bytes(hashlib.blake2b(text[i:i + 3].encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def simhash_bands(fingerprint: int) -> List[Tuple[int, int]]:
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(band, fingerprint >> (band * SIMHASH_BAND_BITS) & mask) for band in range(SIMHASH_BANDS)]
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by an in-process LRU and a persistent disk cache.
+
+    Vectors are keyed by SHA-256 of the model name and the text, so repeated
+    queries and identical chunks are only sent to the embedding API once.
+    With quantize enabled, cached vectors are stored as int8 plus a scale,
+    roughly a quarter of the float32 size. Disk growth is bounded by
+    diskcache's size limit, which evicts the least recently stored entries.
+
+    Queries are keyed on their normalized text so trivial variants share an
+    entry. With fuzzy enabled, a query miss also reuses the vector of a recent
+    query whose SimHash is within SIMHASH_MAX_DISTANCE bits.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str, capacity: int = 1000, quantize: bool = True, fuzzy: bool = False):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.capacity = capacity
+        self.quantize = quantize
+        self.fuzzy = fuzzy
+        self.simhashes: "OrderedDict[bytes, int]" = OrderedDict()
+        self.simhash_buckets: Dict[Tuple[int, int], set] = {}
+        self.disk_cache = diskcache.Cache(str(cache_dir))
+        self.memory_cache: "OrderedDict[bytes, Union[List[float], Tuple[bytes, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.precomputed = set()
+        self.hits = 0
+        self.misses = 0
+        self.precompute_hits = 0
+        self.fuzzy_hits = 0
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).digest()
+
+    def _query_key(self, normalized: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0query\0{normalized}".encode()).digest()
+
+    def _get(self, key: bytes) -> Optional[List[float]]:
+        entry = self._load(key)
+        self._record(key, entry is not None)
+        return entry
+
+    def _load(self, key: bytes) -> Optional[List[float]]:
+        """Fetch a vector from the memory or disk tier without touching the counters."""
+        with self._lock:
+            entry = self.memory_cache.get(key)
+            if entry is not None:
+                self.memory_cache.move_to_end(key)
+        if entry is None:
+            entry = self.disk_cache.get(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None:
+            return None
+        # Entries written with quantization disabled are plain float lists
+        return dequantize(entry) if isinstance(entry, tuple) else entry
+
+    def _record(self, key: bytes, hit: bool):
+        with self._lock:
+            if not hit:
+                self.misses += 1
+                return
+            self.hits += 1
+            if key in self.precomputed:
+                self.precompute_hits += 1
+
+    def _remember(self, key: bytes, entry: Union[List[float], Tuple[bytes, float]]):
+        with self._lock:
+            self.memory_cache[key] = entry
+            self.memory_cache.move_to_end(key)
+            if len(self.memory_cache) > self.capacity:
+                self.memory_cache.popitem(last=False)
+
+    def _set(self, key: bytes, vector: List[float]):
+        entry = quantize(vector) if self.quantize else vector
+        self.disk_cache.set(key, entry)
+        self._remember(key, entry)
+
+    def _lookup(self, texts: List[str]):
+        """Partition texts into cached vectors and misses grouped by key."""
+        keys = [self._key(text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+        misses: Dict[bytes, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                misses.setdefault(keys[i], []).append(i)
+        return vectors, misses
+
+    def _merge(self, texts: List[str], vectors: List, misses: Dict[bytes, List[int]], fresh: List[List[float]]) -> List[List[float]]:
+        for (key, indices), vector in zip(misses.items(), fresh):
+            self._set(key, vector)
+            for i in indices:
+                vectors[i] = vector
+        logger.info(f"Embedding cache: {len(texts) - sum(len(v) for v in misses.values())} hits, {len(misses)} misses")
+        return vectors
+
+    def _index_simhash(self, key: bytes, normalized: str):
+        """Remember a query's fingerprint for fuzzy lookups, evicting the oldest."""
+        fingerprint = simhash(normalized)
+        with self._lock:
+            if key in self.simhashes:
+                self.simhashes.move_to_end(key)
+                return
+            self.simhashes[key] = fingerprint
+            for band in simhash_bands(fingerprint):
+                self.simhash_buckets.setdefault(band, set()).add(key)
+            if len(self.simhashes) > self.capacity:
+                old_key, old_fingerprint = self.simhashes.popitem(last=False)
+                for band in simhash_bands(old_fingerprint):
+                    bucket = self.simhash_buckets[band]
+                    bucket.discard(old_key)
+                    if not bucket:
+                        del self.simhash_buckets[band]
+
+    def _fuzzy_get(self, normalized: str) -> Optional[List[float]]:
+        """Return the vector of the closest recent query within SIMHASH_MAX_DISTANCE."""
+        fingerprint = simhash(normalized)
+        with self._lock:
+            candidates = set()
+            for band in simhash_bands(fingerprint):
+                candidates.update(self.simhash_buckets.get(band, ()))
+            distances = [(bin(self.simhashes[key] ^ fingerprint).count("1"), key) for key in candidates]
+        distances = [(distance, key) for distance, key in distances if distance <= SIMHASH_MAX_DISTANCE]
+        if not distances:
+            return None
+        vector = self._load(min(distances)[1])
+        if vector is not None:
+            with self._lock:
+                # Turn the miss recorded by the exact lookup into a hit
+                self.misses -= 1
+                self.hits += 1
+                self.fuzzy_hits += 1
+        return vector
+
+    def _lookup_query(self, text: str) -> Tuple[bytes, str, Optional[List[float]]]:
+        normalized = normalize_query(text)
+        key = self._query_key(normalized)
+        vector = self._get(key)
+        if vector is None and self.fuzzy:
+            vector = self._fuzzy_get(normalized)
+            if vector is not None:
+                # Cache under the exact key only; borrowed vectors stay out of the
+                # SimHash buckets so matches can't chain away from the real query
+                self._set(key, vector)
+        return key, normalized, vector
+
+    def _store_query(self, key: bytes, normalized: str, vector: List[float]):
+        """Cache a vector returned by the embedding API and index it for fuzzy lookups."""
+        self._set(key, vector)
+        if self.fuzzy:
+            self._index_simhash(key, normalized)
+
+    def precompute(self, queries: List[str]):
+        """Embed queries ahead of time so later lookups for them are cache hits."""
+        normalized = [normalize_query(query) for query in queries]
+        keys = [self._query_key(text) for text in normalized]
+        missing = []
+        for i, key in enumerate(keys):
+            if self._load(key) is None:
+                missing.append(i)
+            elif self.fuzzy:
+                self._index_simhash(key, normalized[i])
+        if missing:
+            vectors = self.embeddings.embed_documents([queries[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                self._store_query(keys[i], normalized[i], vector)
+        with self._lock:
+            self.precomputed.update(keys)
+
+    def stats(self) -> Dict:
+        """Return cache hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "precompute_hits": self.precompute_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, misses = self._lookup(texts)
+        fresh = []
+        if misses:
+            fresh = self.embeddings.embed_documents([texts[indices[0]] for indices in misses.values()])
+        return self._merge(texts, vectors, misses, fresh)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, misses = self._lookup(texts)
+        fresh = []
+        if misses:
+            fresh = await self.embeddings.aembed_documents([texts[indices[0]] for indices in misses.values()])
+        return self._merge(texts, vectors, misses, fresh)
+
+    def embed_query(self, text: str) -> List[float]:
+        key, normalized, vector = self._lookup_query(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._store_query(key, normalized, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key, normalized, vector = self._lookup_query(text)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self._store_query(key, normalized, vector)
+        return vector
@@ -0,0 +1,83 @@
+from typing import List, Dict, Optional
+import threading
+import logging
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class FastMemoryIndex:
+    """In-RAM matrix of normalized embeddings for brute-force cosine search.
+
+    For small collections a single BLAS matrix-vector product is cheaper than
+    an HNSW traversal with metadata filtering. Arrays are replaced rather than
+    mutated, so searches work on a consistent snapshot without holding the lock.
+    """
+
+    def __init__(self):
+        self.matrix: Optional[np.ndarray] = None
+        self.ids: List[str] = []
+        self.file_ids = np.empty(0, dtype=object)
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        """Append chunks, normalizing vectors so cosine similarity is a dot product."""
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        file_ids = np.array([metadata["file_id"] for metadata in metadatas], dtype=object)
+        with self._lock:
+            self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+            self.ids = self.ids + list(ids)
+            self.file_ids = np.concatenate([self.file_ids, file_ids])
+            self.documents = self.documents + list(documents)
+            self.metadatas = self.metadatas + list(metadatas)
+
+    def remove_file(self, file_id: str):
+        """Drop all chunks belonging to a file."""
+        with self._lock:
+            keep = self.file_ids != file_id
+            if keep.all():
+                return
+            indices = np.flatnonzero(keep)
+            self.matrix = self.matrix[keep]
+            self.file_ids = self.file_ids[keep]
+            self.ids = [self.ids[i] for i in indices]
+            self.documents = [self.documents[i] for i in indices]
+            self.metadatas = [self.metadatas[i] for i in indices]
+
+    def search(self, query_embedding: List[float], k: int, file_id: Optional[str] = None) -> Dict:
+        """Return the top-k chunks in the same shape as a Chroma query result."""
+        with self._lock:
+            matrix, ids, file_ids = self.matrix, self.ids, self.file_ids
+            documents, metadatas = self.documents, self.metadatas
+        if matrix is None or not ids:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+        scores = matrix @ query
+        if file_id:
+            mask = file_ids == file_id
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, len(ids))
+        if k == 0:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return {
+            "ids": [[ids[i] for i in top]],
+            "documents": [[documents[i] for i in top]],
+            "metadatas": [[metadatas[i] for i in top]],
+        }
@@ -0,0 +1,76 @@
+from typing import List, Dict, Optional
+import sqlite3
+import threading
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class FileIndex:
+    """SQLite table with one row per uploaded file.
+
+    Lets file listings be answered without scanning every chunk's metadata
+    in the Chroma collection.
+    """
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, filename TEXT NOT NULL, "
+                "timestamp TEXT NOT NULL, total_chunks INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_user_id ON files (user_id)")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def add(self, file_id: str, user_id: str, filename: str, timestamp: str, total_chunks: int):
+        """Record a file."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, user_id, filename, timestamp, total_chunks) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_id, str(user_id), filename, timestamp, total_chunks)
+            )
+
+    def get(self, file_id: str, user_id: str) -> Optional[Dict]:
+        """Return a single file owned by a user, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT file_id, filename, timestamp, total_chunks FROM files "
+                "WHERE file_id = ? AND user_id = ?",
+                (file_id, str(user_id))
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, user_id: str) -> List[Dict]:
+        """Return all files for a user in upload order."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT file_id, filename, timestamp, total_chunks FROM files "
+                "WHERE user_id = ? ORDER BY timestamp",
+                (str(user_id),)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        return {
+            "file_id": row["file_id"],
+            "filename": row["filename"],
+            "upload_time": row["timestamp"],
+            "total_chunks": row["total_chunks"]
+        }
+
+    def delete(self, file_id: str, user_id: str):
+        """Remove a file."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM files WHERE file_id = ? AND user_id = ?",
+                (file_id, str(user_id))
+            )
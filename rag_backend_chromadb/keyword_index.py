@@ -0,0 +1,112 @@
+from typing import List, Optional, Tuple
+import re
+import sqlite3
+import threading
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class KeywordIndex:
+    """SQLite FTS5 full-text index over document chunks.
+
+    Rows are keyed by the same chunk IDs used in the Chroma collection so
+    keyword and vector results can be fused. FTS5 tables can't enforce
+    uniqueness, so indexed chunk IDs are also tracked in a plain table with a
+    primary key and a chunk is only added to the full-text table once.
+    """
+
+    def __init__(self, db_path: str):
+        # Workers share the database file; wait for each other's writes instead of failing
+        self.conn = sqlite3.connect(str(db_path), timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+                "text, chunk_id UNINDEXED, user_id UNINDEXED, file_id UNINDEXED)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS chunk_ids (chunk_id TEXT PRIMARY KEY)")
+            if (self.conn.execute("SELECT 1 FROM chunk_ids LIMIT 1").fetchone() is None
+                    and self.conn.execute("SELECT 1 FROM chunks_fts LIMIT 1").fetchone() is not None):
+                # Index created before chunk IDs were tracked; drop duplicate rows first
+                logger.info("Removing duplicate chunks from keyword index")
+                self.conn.execute(
+                    "DELETE FROM chunks_fts WHERE rowid NOT IN "
+                    "(SELECT MIN(rowid) FROM chunks_fts GROUP BY chunk_id)"
+                )
+                self.conn.execute("INSERT OR IGNORE INTO chunk_ids (chunk_id) SELECT chunk_id FROM chunks_fts")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM chunk_ids LIMIT 1").fetchone() is None
+
+    def _insert(self, rows: List[Tuple[str, str, str, str]]) -> int:
+        """Insert (chunk_id, text, user_id, file_id) rows, skipping chunk IDs already indexed."""
+        inserted = 0
+        for chunk_id, chunk, user_id, file_id in rows:
+            if self.conn.execute("INSERT OR IGNORE INTO chunk_ids (chunk_id) VALUES (?)", (chunk_id,)).rowcount:
+                self.conn.execute(
+                    "INSERT INTO chunks_fts (text, chunk_id, user_id, file_id) VALUES (?, ?, ?, ?)",
+                    (chunk, chunk_id, str(user_id), file_id)
+                )
+                inserted += 1
+        return inserted
+
+    def add(self, chunk_ids: List[str], chunks: List[str], user_id: str, file_id: str):
+        """Index chunks for a file."""
+        with self._lock, self.conn:
+            self._insert([(chunk_id, chunk, user_id, file_id) for chunk_id, chunk in zip(chunk_ids, chunks)])
+
+    def backfill(self, rows: List[Tuple[str, str, str, str]]) -> int:
+        """Populate an empty index with (chunk_id, text, user_id, file_id) rows.
+
+        Runs as a single write transaction that re-checks emptiness, so workers
+        starting together fill the index once and a crash leaves it empty.
+
+        Returns:
+            Number of chunks inserted (0 if another process already filled the index)
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.conn.execute("SELECT 1 FROM chunk_ids LIMIT 1").fetchone() is not None:
+                    self.conn.rollback()
+                    return 0
+                inserted = self._insert(rows)
+                self.conn.commit()
+                return inserted
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def search(self, query: str, limit: int, user_id: Optional[str] = None, file_id: Optional[str] = None) -> List[str]:
+        """Return chunk IDs matching any query term, best match first."""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        # Quote every term so punctuation in the question can't break FTS syntax
+        sql = "SELECT chunk_id FROM chunks_fts WHERE chunks_fts MATCH ?"
+        params = [" OR ".join(f'"{term}"' for term in terms)]
+        if user_id:
+            sql += " AND user_id = ?"
+            params.append(str(user_id))
+        if file_id:
+            sql += " AND file_id = ?"
+            params.append(file_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def delete(self, file_id: str, user_id: str):
+        """Remove all chunks for a file."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM chunk_ids WHERE chunk_id IN "
+                "(SELECT chunk_id FROM chunks_fts WHERE file_id = ? AND user_id = ?)",
+                (file_id, str(user_id))
+            )
+            self.conn.execute(
+                "DELETE FROM chunks_fts WHERE file_id = ? AND user_id = ?",
+                (file_id, str(user_id))
+            )
@@ -1,11 +1,17 @@
 import os
+import asyncio
 import logging
 from logging.handlers import RotatingFileHandler
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
-import shutil
+from functools import lru_cache
+from urllib.parse import quote
+import aiofiles
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from langchain_openai import AzureChatOpenAI
 from config import (
     UPLOAD_DIR,
@@ -18,10 +24,14 @@ from config import (
     CHUNK_OVERLAP,
     TOP_K_RESULTS,
     ALLOWED_EXTENSIONS,
+    WARMUP_QUERIES_FILE,
+    LOAD_DOCUMENTS_NUM_WORKERS,
+    WEB_WORKERS,
+    ACCEL_REDIRECT_PREFIX,
 )
-from document_processor import DocumentProcessor
+from document_processor import process_document_in_worker
 from vector_store import VectorStore
-from fastapi.responses import FileResponse as FastAPIFileResponse
+from fastapi.responses import FileResponse as FastAPIFileResponse, ORJSONResponse, StreamingResponse, Response
 
 # Configure logging
 def setup_logging():
@@ -53,7 +63,7 @@ def setup_logging():
 # Initialize logger
 logger = setup_logging()
 
-app = FastAPI(title="RAG API")
+app = FastAPI(title="RAG API", default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -64,16 +74,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-document_processor = DocumentProcessor()
-vector_store = VectorStore()
-llm = AzureChatOpenAI(
-    azure_deployment=AZURE_OPENAI_CHAT_DEPLOYMENT,
-    openai_api_key=AZURE_OPENAI_API_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    openai_api_version=AZURE_OPENAI_API_VERSION,
-    temperature=0
-)
+# Shared components, built once per process on first use
+@lru_cache()
+def get_process_pool() -> ProcessPoolExecutor:
+    # Document loading and chunking is CPU-bound, so it runs off the event loop
+    return ProcessPoolExecutor(max_workers=LOAD_DOCUMENTS_NUM_WORKERS)
+
+@lru_cache()
+def get_vector_store() -> VectorStore:
+    return VectorStore()
+
+@lru_cache()
+def get_llm() -> AzureChatOpenAI:
+    return AzureChatOpenAI(
+        azure_deployment=AZURE_OPENAI_CHAT_DEPLOYMENT,
+        openai_api_key=AZURE_OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        openai_api_version=AZURE_OPENAI_API_VERSION,
+        temperature=0
+    )
+
+@app.on_event("startup")
+async def init_components():
+    """Build shared components at startup so the first request doesn't pay for it."""
+    logger.info("Initializing components")
+    get_process_pool()
+    get_vector_store()
+    get_llm()
+
+@app.on_event("shutdown")
+async def shutdown_components():
+    """Stop the document processing workers."""
+    logger.info("Shutting down document processing pool")
+    get_process_pool().shutdown()
+
+async def process_document(file_path: str) -> List[str]:
+    """Load and chunk a document in the shared process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), process_document_in_worker, file_path)
+
+@app.on_event("startup")
+async def warmup_embedding_cache():
+    """Pre-embed common queries so the first questions skip the embedding API."""
+    if not os.path.exists(WARMUP_QUERIES_FILE):
+        logger.info(f"No warmup queries file at: {WARMUP_QUERIES_FILE}")
+        return
+    with open(WARMUP_QUERIES_FILE, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    try:
+        get_vector_store().warmup(queries)
+    except Exception as e:
+        # Warmup is an optimization only; the API still works with a cold cache
+        logger.error(f"Embedding cache warmup failed: {str(e)}")
 
 # Models
 class Question(BaseModel):
@@ -98,6 +150,9 @@ class DeleteFileRequest(BaseModel):
     file_id: str
     user_id: str
 
+# Read uploads in 1 MiB chunks, matching shutil.copyfileobj's buffer size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 # Helper function to get user ID (replace with authentication logic)
 async def get_user_id(user_id: str = None):
     if not user_id:
@@ -105,35 +160,42 @@ async def get_user_id(user_id: str = None):
         raise HTTPException(status_code=401, detail="User ID is required")
     return user_id
 
+async def save_upload(file: UploadFile) -> str:
+    """Save an uploaded file to the uploads directory and return its path."""
+    # Create uploads directory if it doesn't exist
+    if not os.path.exists(UPLOAD_DIR):
+        logger.info(f"Creating uploads directory at: {UPLOAD_DIR}")
+        os.makedirs(UPLOAD_DIR)
+
+    file_path = os.path.join(UPLOAD_DIR, file.filename)
+    logger.info(f"Saving uploaded file to: {file_path}")
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
+    logger.info("File saved successfully")
+    return file_path
+
 @app.post("/upload/", response_model=FileResponse)
 async def upload_file(
     file: UploadFile = File(...),
-    user_id: str = Form(...)
+    user_id: str = Form(...),
+    vector_store: VectorStore = Depends(get_vector_store)
 ):
     """Handle file upload and process it for RAG."""
     try:
         logger.info(f"Processing file upload: {file.filename} for user: {user_id}")
         
-        # Create uploads directory if it doesn't exist
-        if not os.path.exists(UPLOAD_DIR):
-            logger.info(f"Creating uploads directory at: {UPLOAD_DIR}")
-            os.makedirs(UPLOAD_DIR)
-        
         # Save the uploaded file
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        logger.info(f"Saving uploaded file to: {file_path}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info("File saved successfully")
+        file_path = await save_upload(file)
 
         # Process the document
         logger.info("Processing document into chunks")
-        chunks = document_processor.process_document(file_path)
+        chunks = await process_document(file_path)
         logger.info(f"Document processed into {len(chunks)} chunks")
         
         # Store in vector database
         logger.info("Storing document in vector database")
-        file_id = vector_store.add_documents(
+        file_id = await vector_store.add_documents(
             chunks=chunks,
             user_id=user_id,
             filename=file.filename
@@ -155,14 +217,67 @@ async def upload_file(
         logger.error(f"Error processing file upload: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/upload_bulk/", response_model=List[FileResponse])
+async def upload_files_bulk(
+    files: List[UploadFile] = File(...),
+    user_id: str = Form(...),
+    vector_store: VectorStore = Depends(get_vector_store)
+):
+    """Handle multi-file upload, chunking the files in parallel."""
+    try:
+        logger.info(f"Processing bulk upload of {len(files)} files for user: {user_id}")
+
+        # Save files sequentially to avoid disk thrash, then chunk them in parallel
+        file_paths = []
+        for file in files:
+            file_paths.append(await save_upload(file))
+
+        logger.info(f"Processing {len(file_paths)} documents with up to {LOAD_DOCUMENTS_NUM_WORKERS} workers")
+        all_chunks = await asyncio.gather(*(process_document(file_path) for file_path in file_paths))
+
+        # Store in vector database
+        results = []
+        for file, chunks in zip(files, all_chunks):
+            logger.info(f"Storing {file.filename} ({len(chunks)} chunks) in vector database")
+            file_id = await vector_store.add_documents(
+                chunks=chunks,
+                user_id=user_id,
+                filename=file.filename
+            )
+            results.append({
+                "file_id": file_id,
+                "filename": file.filename,
+                "chunks": len(chunks)
+            })
+
+        logger.info(f"Bulk upload complete: {len(results)} files stored")
+        return results
+
+    except Exception as e:
+        logger.error(f"Error processing bulk upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(data: dict) -> str:
+    """Format a dict as a server-sent event."""
+    return f"data: {orjson.dumps(data).decode()}\n\n"
+
 @app.post("/ask/")
-async def ask_question(question: Question):
-    """Handle question answering using RAG."""
+async def ask_question(
+    question: Question,
+    vector_store: VectorStore = Depends(get_vector_store),
+    llm: AzureChatOpenAI = Depends(get_llm)
+):
+    """Handle question answering using RAG, streaming the answer as server-sent events.
+
+    The first event carries the sources, followed by answer deltas as the LLM
+    generates them.
+    """
     try:
         logger.info(f"Processing question for user {question.user_id}: {question.text}")
         
-        # Search for relevant chunks
-        relevant_chunks = vector_store.search(
+        # Search for relevant chunks off the event loop; it waits on the embedding API and ChromaDB
+        relevant_chunks = await run_in_threadpool(
+            vector_store.search,
             query=question.text,
             user_id=question.user_id,
             file_id=question.file_id
@@ -170,7 +285,12 @@ async def ask_question(question: Question):
         
         if not relevant_chunks:
             logger.warning(f"No relevant chunks found for question: {question.text}")
-            return {"answer": "I couldn't find any relevant information to answer your question."}
+
+            async def no_answer():
+                yield sse_event({"sources": []})
+                yield sse_event({"delta": "I couldn't find any relevant information to answer your question."})
+
+            return StreamingResponse(no_answer(), media_type="text/event-stream")
 
         # Prepare context from chunks
         context = "\n\n".join(chunk["text"] for chunk in relevant_chunks)
@@ -187,27 +307,35 @@ async def ask_question(question: Question):
 
         Answer:"""
 
-        # Generate response
-        response = llm.invoke(prompt)
-        logger.info("Generated response from LLM")
-        
-        return {
-            "answer": response.content,
-            "sources": [
-                {
-                    "filename": chunk["metadata"]["filename"],
-                    "chunk_index": chunk["metadata"]["chunk_index"]
-                }
-                for chunk in relevant_chunks
-            ]
-        }
+        sources = [
+            {
+                "filename": chunk["metadata"]["filename"],
+                "chunk_index": chunk["metadata"]["chunk_index"]
+            }
+            for chunk in relevant_chunks
+        ]
+
+        async def generate():
+            yield sse_event({"sources": sources})
+            try:
+                # Stream tokens to the client as the LLM generates them
+                async for chunk in llm.astream(prompt):
+                    if chunk.content:
+                        yield sse_event({"delta": chunk.content})
+                logger.info("Streamed response from LLM")
+            except Exception as e:
+                # Headers are already sent, so report the failure in-stream
+                logger.error(f"Error streaming LLM response: {str(e)}", exc_info=True)
+                yield sse_event({"error": str(e)})
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
 
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/files/{user_id}", response_model=FileList)
-async def list_user_files(user_id: str):
+async def list_user_files(user_id: str, vector_store: VectorStore = Depends(get_vector_store)):
     """List all files uploaded by a user."""
     try:
         logger.info(f"Listing files for user: {user_id}")
@@ -219,25 +347,19 @@ async def list_user_files(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/files/")
-async def delete_file(request: DeleteFileRequest):
+async def delete_file(request: DeleteFileRequest, vector_store: VectorStore = Depends(get_vector_store)):
     """Delete a file and all its chunks."""
     try:
         logger.info(f"Attempting to delete file {request.file_id} for user {request.user_id}")
         
-        # Get file info before deleting from vector store
-        file_info = vector_store.get_file_info(request.file_id, request.user_id)
-        if not file_info:
-            logger.warning(f"File deletion failed: {request.file_id} - File not found in vector store")
-            raise HTTPException(status_code=404, detail="File not found or access denied")
-            
-        # Delete from vector store
-        success = vector_store.delete_file(
+        # Delete from vector store, getting back the file info
+        file_info = vector_store.delete_file(
             file_id=request.file_id,
             user_id=request.user_id
         )
         
-        if not success:
-            logger.warning(f"File deletion failed: {request.file_id}")
+        if not file_info:
+            logger.warning(f"File deletion failed: {request.file_id} - File not found in vector store")
             raise HTTPException(status_code=404, detail="File not found or access denied")
             
         # Delete physical file
@@ -259,7 +381,7 @@ async def delete_file(request: DeleteFileRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/files/{user_id}/{file_id}/content")
-async def get_file_content(user_id: str, file_id: str):
+async def get_file_content(user_id: str, file_id: str, vector_store: VectorStore = Depends(get_vector_store)):
     """Serve the content of a file."""
     try:
         logger.info(f"Fetching content for file {file_id} for user {user_id}")
@@ -278,17 +400,20 @@ async def get_file_content(user_id: str, file_id: str):
             raise HTTPException(status_code=404, detail="File not found")
             
         # Determine the media type based on file extension
-        media_type = "application/octet-stream"
-        if file_info["filename"].lower().endswith('.pdf'):
-            media_type = "application/pdf"
-        elif file_info["filename"].lower().endswith('.txt'):
-            media_type = "text/plain"
-        elif file_info["filename"].lower().endswith('.doc'):
-            media_type = "application/msword"
-        elif file_info["filename"].lower().endswith('.docx'):
-            media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        ext = file_info["filename"].rsplit(".", 1)[-1].lower()
+        media_type = ALLOWED_EXTENSIONS.get(ext, "application/octet-stream")
             
         logger.info(f"Serving file with media type: {media_type}")
+        if ACCEL_REDIRECT_PREFIX:
+            # Let the reverse proxy send the file bytes straight from disk
+            quoted_filename = quote(file_info["filename"])
+            return Response(
+                media_type=media_type,
+                headers={
+                    "X-Accel-Redirect": f"{ACCEL_REDIRECT_PREFIX}{quoted_filename}",
+                    "Content-Disposition": f"attachment; filename*=utf-8''{quoted_filename}",
+                }
+            )
         return FastAPIFileResponse(
             path=file_path,
             media_type=media_type,
@@ -298,8 +423,21 @@ async def get_file_content(user_id: str, file_id: str):
         logger.error(f"Error serving file content: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats/")
+async def get_stats(vector_store: VectorStore = Depends(get_vector_store)):
+    """Return embedding cache statistics."""
+    return vector_store.embeddings.stats()
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting FastAPI application")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
+    # "auto" picks uvloop and httptools when installed, falling back to asyncio/h11
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=WEB_WORKERS,
+        loop="auto",
+        http="auto"
+    )
     # uvicorn.run("main:app", reload=True)
\ No newline at end of file
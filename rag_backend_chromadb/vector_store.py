@@ -1,10 +1,19 @@
 from typing import List, Dict, Optional
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 import chromadb
 from chromadb.config import Settings
 from langchain_openai import AzureOpenAIEmbeddings
 import datetime
 import uuid
 import logging
+from embedding_cache import CachedEmbeddings
+from keyword_index import KeywordIndex
+from file_index import FileIndex
+from fast_index import FastMemoryIndex
 from config import (
     CHROMA_DB_DIR,
     AZURE_OPENAI_API_KEY,
@@ -12,34 +21,161 @@ from config import (
     AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
     AZURE_OPENAI_API_VERSION,
     TOP_K_RESULTS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_QUANTIZE,
+    EMBEDDING_CACHE_FUZZY,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF,
+    KEYWORD_INDEX_DB,
+    FILE_INDEX_DB,
+    FILE_INFO_CACHE_TTL,
+    FAST_INDEX_MAX_VECTORS,
+    FAST_INDEX_MAX_USERS,
+    CHROMA_SERVER_HOST,
+    CHROMA_SERVER_PORT,
 )
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Rank offset for Reciprocal Rank Fusion of keyword and vector results
+RRF_K = 60
+
 class VectorStore:
     def __init__(self):
         try:
-            self.embeddings = AzureOpenAIEmbeddings(
-                azure_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-                openai_api_key=AZURE_OPENAI_API_KEY,
-                azure_endpoint=AZURE_OPENAI_ENDPOINT,
-                openai_api_version=AZURE_OPENAI_API_VERSION,
-            )
-            self.client = chromadb.PersistentClient(
-                path=str(CHROMA_DB_DIR),
-                settings=Settings(allow_reset=True)
+            self.embeddings = CachedEmbeddings(
+                AzureOpenAIEmbeddings(
+                    azure_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+                    openai_api_key=AZURE_OPENAI_API_KEY,
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    openai_api_version=AZURE_OPENAI_API_VERSION,
+                ),
+                model_name=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+                cache_dir=EMBEDDING_CACHE_DIR,
+                capacity=EMBEDDING_CACHE_SIZE,
+                quantize=EMBEDDING_CACHE_QUANTIZE,
+                fuzzy=EMBEDDING_CACHE_FUZZY,
             )
+            if CHROMA_SERVER_HOST:
+                # A shared server is required when running multiple workers
+                self.client = chromadb.HttpClient(
+                    host=CHROMA_SERVER_HOST,
+                    port=CHROMA_SERVER_PORT,
+                    settings=Settings(allow_reset=True)
+                )
+            else:
+                self.client = chromadb.PersistentClient(
+                    path=str(CHROMA_DB_DIR),
+                    settings=Settings(allow_reset=True)
+                )
             self.collection = self.client.get_or_create_collection(
                 name="documents",
-                metadata={"hnsw:space": "cosine"}
+                metadata={
+                    "hnsw:space": "cosine",
+                    "hnsw:M": HNSW_M,
+                    "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+                    "hnsw:search_ef": HNSW_SEARCH_EF,
+                }
             )
+            self.keyword_index = KeywordIndex(KEYWORD_INDEX_DB)
+            self._search_executor = ThreadPoolExecutor(max_workers=4)
+            self.file_index = FileIndex(FILE_INDEX_DB)
+            self._file_info_cache = TTLCache(maxsize=1024, ttl=FILE_INFO_CACHE_TTL)
+            self._file_info_lock = threading.Lock()
+            # Per-user in-RAM indexes for small collections, loaded on first search
+            # and kept for the FAST_INDEX_MAX_USERS most recently searched users
+            self._memory_indexes: "OrderedDict[str, FastMemoryIndex]" = OrderedDict()
+            self._memory_index_lock = threading.Lock()
+            # Per-user locks held while an index loads, and per-user write counters
+            # so a load that overlapped an upload or delete is not cached
+            self._memory_index_loading: Dict[str, threading.Lock] = {}
+            self._memory_index_versions: Dict[str, int] = {}
+            if self.file_index.is_empty() and self.collection.count() > 0:
+                self._backfill_file_index()
+            if self.keyword_index.is_empty() and self.collection.count() > 0:
+                self._backfill_keyword_index()
             logger.info("VectorStore initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing VectorStore: {str(e)}", exc_info=True)
             raise
 
-    def add_documents(self, chunks: List[str], user_id: str, filename: str, metadata: Optional[Dict] = None):
+    def _backfill_file_index(self):
+        """Populate the file index from chunk metadata already stored in ChromaDB."""
+        logger.info("Backfilling file index from ChromaDB metadata")
+        results = self.collection.get(include=["metadatas"])
+        seen = set()
+        for metadata in results["metadatas"]:
+            if metadata["file_id"] in seen:
+                continue
+            seen.add(metadata["file_id"])
+            self.file_index.add(
+                file_id=metadata["file_id"],
+                user_id=metadata["user_id"],
+                filename=metadata["filename"],
+                timestamp=metadata["timestamp"],
+                total_chunks=metadata["total_chunks"]
+            )
+        logger.info(f"Backfilled {len(seen)} files into file index")
+
+    def _backfill_keyword_index(self):
+        """Populate the keyword index from chunks already stored in ChromaDB."""
+        logger.info("Backfilling keyword index from ChromaDB documents")
+        results = self.collection.get(include=["documents", "metadatas"])
+        rows = [
+            (chunk_id, doc, metadata["user_id"], metadata["file_id"])
+            for chunk_id, doc, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+        inserted = self.keyword_index.backfill(rows)
+        logger.info(f"Backfilled {inserted} chunks into keyword index")
+
+    def warmup(self, queries: List[str]):
+        """Pre-embed common queries so their first search is a cache hit.
+        
+        Args:
+            queries: List of queries to embed ahead of time
+        """
+        try:
+            if not queries:
+                logger.info("No warmup queries provided")
+                return
+            logger.info(f"Warming up embedding cache with {len(queries)} queries")
+            self.embeddings.precompute(queries)
+            logger.info("Embedding cache warmup complete")
+        except Exception as e:
+            logger.error(f"Error in warmup: {str(e)}", exc_info=True)
+            raise
+
+    async def _embed_batched(self, chunks: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+        """Embed chunks in batches issued concurrently, preserving chunk order.
+        
+        At most EMBEDDING_MAX_CONCURRENCY batches are in flight at once to stay
+        within the embedding deployment's rate limits.
+        
+        Args:
+            chunks: List of text chunks
+            batch_size: Maximum number of chunks sent per embedding request
+            
+        Returns:
+            List of embeddings in the same order as the input chunks
+        """
+        batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+        logger.info(f"Embedding {len(chunks)} chunks in {len(batches)} batches of up to {batch_size}")
+        semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings.aembed_documents(batch)
+
+        # gather returns results in the order the batches were submitted
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    async def add_documents(self, chunks: List[str], user_id: str, filename: str, metadata: Optional[Dict] = None):
         """Add document chunks to the vector store with user and file tracking.
         
         Args:
@@ -60,33 +196,50 @@ class VectorStore:
 
             logger.info(f"Processing {len(chunks)} chunks for file {filename} (ID: {file_id})")
 
-            # Prepare metadata for each chunk
-            chunk_metadatas = []
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    "user_id": str(user_id),  # Ensure user_id is string
-                    "file_id": file_id,
-                    "filename": filename,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    "timestamp": timestamp,
-                }
-                if metadata:
-                    chunk_metadata.update(metadata)
-                chunk_metadatas.append(chunk_metadata)
+            # Prepare metadata for each chunk from a shared template; only chunk_index varies
+            base_metadata = {
+                "user_id": str(user_id),  # Ensure user_id is string
+                "file_id": file_id,
+                "filename": filename,
+                "total_chunks": len(chunks),
+                "timestamp": timestamp,
+            }
+            if metadata:
+                base_metadata.update(metadata)
+            chunk_metadatas = [{**base_metadata, "chunk_index": i} for i in range(len(chunks))]
 
-            # Generate embeddings for chunks
-            logger.info("Generating embeddings for chunks")
-            embeddings = self.embeddings.embed_documents(chunks)
+            # Embed each distinct chunk once; the embedding cache skips the API
+            # for chunks seen in earlier uploads
+            unique_chunks = list(dict.fromkeys(chunks))
+            logger.info(f"Generating embeddings for {len(unique_chunks)} distinct chunks")
+            vectors = dict(zip(unique_chunks, await self._embed_batched(unique_chunks)))
+            embeddings = [vectors[chunk] for chunk in chunks]
             
             # Add to ChromaDB with detailed metadata
             logger.info("Adding documents to ChromaDB")
-            self.collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=chunk_metadatas,
-                ids=[f"{file_id}_chunk_{i}" for i in range(len(chunks))]
-            )
+            ids = [f"{file_id}_chunk_{i}" for i in range(len(chunks))]
+            try:
+                self.collection.add(
+                    embeddings=embeddings,
+                    documents=chunks,
+                    metadatas=chunk_metadatas,
+                    ids=ids
+                )
+                self.keyword_index.add(ids, chunks, user_id=user_id, file_id=file_id)
+                self.file_index.add(
+                    file_id=file_id,
+                    user_id=user_id,
+                    filename=filename,
+                    timestamp=timestamp,
+                    total_chunks=len(chunks)
+                )
+            except Exception:
+                # Don't leave searchable chunks behind that /files/ can't list or delete
+                logger.error(f"Failed to store file {file_id}, rolling back partial writes")
+                self._rollback_add(file_id, user_id)
+                raise
+            self._add_to_memory_index(str(user_id), ids, embeddings, chunks, chunk_metadatas)
+            self._invalidate_file_info(file_id, user_id)
             logger.info(f"Successfully added documents to ChromaDB with file_id: {file_id}")
             return file_id
 
@@ -94,6 +247,19 @@ class VectorStore:
             logger.error(f"Error in add_documents: {str(e)}", exc_info=True)
             raise
 
+    def _rollback_add(self, file_id: str, user_id: str):
+        """Best-effort removal of everything a failed add_documents may have written."""
+        steps = [
+            lambda: self.collection.delete(where={"file_id": {"$eq": file_id}}),
+            lambda: self.keyword_index.delete(file_id, user_id),
+            lambda: self.file_index.delete(file_id, user_id),
+        ]
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Error rolling back file {file_id}: {str(e)}", exc_info=True)
+
     def search(self, query: str, user_id: Optional[str] = None, file_id: Optional[str] = None) -> List[Dict]:
         """Search for similar chunks in the vector store with optional filtering.
         
@@ -112,9 +278,6 @@ class VectorStore:
             if file_id:
                 logger.info(f"Filtering by file_id: {file_id}")
 
-            # Generate embedding for the query
-            query_embedding = self.embeddings.embed_query(query)
-            
             # Prepare where clause for filtering
             where = None
             if user_id and file_id:
@@ -129,24 +292,31 @@ class VectorStore:
             elif file_id:
                 where = {"file_id": {"$eq": file_id}}
             
-            # Search in ChromaDB
-            logger.info("Executing search in ChromaDB")
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=TOP_K_RESULTS,
-                where=where
-            )
+            # Run the vector search in a thread while the keyword search runs here
+            logger.info("Executing hybrid search in ChromaDB and keyword index")
+            vector_future = self._search_executor.submit(self._vector_query, query, where, user_id, file_id)
+            keyword_ids = self.keyword_index.search(query, TOP_K_RESULTS, user_id=user_id, file_id=file_id)
+            results = vector_future.result()
             
-            # Combine documents with their metadata
-            if results["documents"] and results["metadatas"]:
-                logger.info(f"Found {len(results['documents'][0])} relevant chunks")
-                return [
-                    {
-                        "text": doc,
-                        "metadata": meta
-                    }
-                    for doc, meta in zip(results["documents"][0], results["metadatas"][0])
-                ]
+            # Collect vector hits, then fuse both rankings
+            chunks_by_id = {}
+            vector_ids = results["ids"][0] if results["ids"] else []
+            if vector_ids:
+                for chunk_id, doc, meta in zip(vector_ids, results["documents"][0], results["metadatas"][0]):
+                    chunks_by_id[chunk_id] = {"text": doc, "metadata": meta}
+            ranked_ids = self._reciprocal_rank_fusion([vector_ids, keyword_ids])[:TOP_K_RESULTS]
+            
+            # Fetch text and metadata for keyword-only hits
+            missing_ids = [chunk_id for chunk_id in ranked_ids if chunk_id not in chunks_by_id]
+            if missing_ids:
+                extra = self.collection.get(ids=missing_ids)
+                for chunk_id, doc, meta in zip(extra["ids"], extra["documents"], extra["metadatas"]):
+                    chunks_by_id[chunk_id] = {"text": doc, "metadata": meta}
+            
+            relevant_chunks = [chunks_by_id[chunk_id] for chunk_id in ranked_ids if chunk_id in chunks_by_id]
+            if relevant_chunks:
+                logger.info(f"Found {len(relevant_chunks)} relevant chunks ({len(vector_ids)} vector, {len(keyword_ids)} keyword)")
+                return relevant_chunks
             logger.info("No relevant chunks found")
             return []
 
@@ -154,6 +324,102 @@ class VectorStore:
             logger.error(f"Error in search: {str(e)}", exc_info=True)
             raise
 
+    def _vector_query(self, query: str, where: Optional[Dict], user_id: Optional[str], file_id: Optional[str]) -> Dict:
+        """Embed the query and run the nearest-neighbour search.
+        
+        Small per-user collections are searched in memory; everything else
+        goes to ChromaDB.
+        """
+        query_embedding = self.embeddings.embed_query(query)
+        memory_index = self._get_memory_index(str(user_id)) if user_id else None
+        if memory_index is not None:
+            logger.info(f"Searching in-memory index ({len(memory_index)} chunks) for user {user_id}")
+            return memory_index.search(query_embedding, TOP_K_RESULTS, file_id=file_id)
+        return self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=TOP_K_RESULTS,
+            where=where
+        )
+
+    def _get_memory_index(self, user_id: str) -> Optional[FastMemoryIndex]:
+        """Return the user's in-memory index, loading it from ChromaDB if the user is small enough.
+        
+        Loading happens under a per-user lock so other users' uploads, deletes
+        and searches are not blocked by the ChromaDB read.
+        """
+        if FAST_INDEX_MAX_VECTORS <= 0:
+            return None
+        with self._memory_index_lock:
+            memory_index = self._memory_indexes.get(user_id)
+            if memory_index is not None:
+                self._memory_indexes.move_to_end(user_id)
+                return memory_index
+            loading_lock = self._memory_index_loading.setdefault(user_id, threading.Lock())
+
+        with loading_lock:
+            # Another search may have loaded the index while we waited
+            with self._memory_index_lock:
+                memory_index = self._memory_indexes.get(user_id)
+                if memory_index is not None:
+                    return memory_index
+                # Don't displace a lock registered by a newer caller while we waited
+                self._memory_index_loading.setdefault(user_id, loading_lock)
+                version = self._memory_index_versions.get(user_id, 0)
+
+            memory_index = None
+            try:
+                total_chunks = sum(file["total_chunks"] for file in self.file_index.list(user_id))
+                if 0 < total_chunks < FAST_INDEX_MAX_VECTORS:
+                    logger.info(f"Loading {total_chunks} chunks into in-memory index for user {user_id}")
+                    results = self.collection.get(
+                        where={"user_id": {"$eq": user_id}},
+                        include=["embeddings", "documents", "metadatas"]
+                    )
+                    memory_index = FastMemoryIndex()
+                    memory_index.add(results["ids"], results["embeddings"], results["documents"], results["metadatas"])
+            finally:
+                with self._memory_index_lock:
+                    if self._memory_index_loading.get(user_id) is loading_lock:
+                        del self._memory_index_loading[user_id]
+                    # Only cache the index if no upload or delete ran since the read began
+                    if memory_index is not None and self._memory_index_versions.get(user_id, 0) == version:
+                        self._memory_indexes[user_id] = memory_index
+                        while len(self._memory_indexes) > FAST_INDEX_MAX_USERS:
+                            evicted_user, _ = self._memory_indexes.popitem(last=False)
+                            logger.info(f"Evicted in-memory index for user {evicted_user}")
+            return memory_index
+
+    def _add_to_memory_index(self, user_id: str, ids: List[str], embeddings: List[List[float]], chunks: List[str], metadatas: List[Dict]):
+        """Append new chunks to a loaded in-memory index, dropping it once it grows too large."""
+        with self._memory_index_lock:
+            self._memory_index_versions[user_id] = self._memory_index_versions.get(user_id, 0) + 1
+            memory_index = self._memory_indexes.get(user_id)
+            # Skip if the index was loaded after these chunks reached ChromaDB
+            if memory_index is None or ids[0] in memory_index.ids:
+                return
+            if len(memory_index) + len(ids) >= FAST_INDEX_MAX_VECTORS:
+                logger.info(f"User {user_id} exceeded in-memory index size, falling back to ChromaDB")
+                del self._memory_indexes[user_id]
+                return
+            memory_index.add(ids, embeddings, chunks, metadatas)
+
+    def _remove_from_memory_index(self, user_id: str, file_id: str):
+        """Drop a deleted file's chunks from the user's in-memory index."""
+        with self._memory_index_lock:
+            self._memory_index_versions[user_id] = self._memory_index_versions.get(user_id, 0) + 1
+            memory_index = self._memory_indexes.get(user_id)
+        if memory_index is not None:
+            memory_index.remove_file(file_id)
+
+    @staticmethod
+    def _reciprocal_rank_fusion(rankings: List[List[str]]) -> List[str]:
+        """Merge ranked ID lists, scoring each ID by the sum of 1 / (RRF_K + rank)."""
+        scores = {}
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking, start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+        return sorted(scores, key=scores.get, reverse=True)
+
     def get_user_files(self, user_id: str) -> List[Dict]:
         """Get all files uploaded by a specific user.
         
@@ -165,35 +431,19 @@ class VectorStore:
         """
         try:
             logger.info(f"Getting files for user_id: {user_id}")
-            # Get all documents for the user
-            results = self.collection.get(
-                where={"user_id": {"$eq": str(user_id)}}  # Ensure user_id is string
-            )
-            
-            if not results["metadatas"]:
+            files = self.file_index.list(user_id)
+            if not files:
                 logger.info(f"No files found for user_id: {user_id}")
                 return []
-                
-            # Group by file_id and get unique files
-            files = {}
-            for metadata in results["metadatas"]:
-                file_id = metadata["file_id"]
-                if file_id not in files:
-                    files[file_id] = {
-                        "file_id": file_id,
-                        "filename": metadata["filename"],
-                        "upload_time": metadata["timestamp"],
-                        "total_chunks": metadata["total_chunks"]
-                    }
             
             logger.info(f"Found {len(files)} unique files for user_id: {user_id}")
-            return list(files.values())
+            return files
 
         except Exception as e:
             logger.error(f"Error in get_user_files: {str(e)}", exc_info=True)
             raise
 
-    def delete_file(self, file_id: str, user_id: str) -> bool:
+    def delete_file(self, file_id: str, user_id: str) -> Optional[Dict]:
         """Delete all chunks associated with a specific file.
         
         Args:
@@ -201,28 +451,45 @@ class VectorStore:
             user_id: The user ID who owns the file
             
         Returns:
-            bool: True if deletion was successful
+            Dict containing the deleted file's information or None if not found
         """
         try:
             logger.info(f"Deleting file {file_id} for user {user_id}")
+            # The file index row is a single indexed lookup, so ChromaDB is only
+            # filtered once, by the delete itself
+            file_info = self.file_index.get(file_id, user_id)
+            if not file_info:
+                logger.info(f"No file found with ID {file_id} for user {user_id}")
+                return None
+            
             # Delete all chunks for this file
-            self.collection.delete(
-                where={
-                    "$and": [
-                        {"file_id": {"$eq": file_id}},
-                        {"user_id": {"$eq": str(user_id)}}  # Ensure user_id is string
-                    ]
-                }
-            )
+            where = {
+                "$and": [
+                    {"file_id": {"$eq": file_id}},
+                    {"user_id": {"$eq": str(user_id)}}  # Ensure user_id is string
+                ]
+            }
+            self.collection.delete(where=where)
+            self.keyword_index.delete(file_id, user_id)
+            self.file_index.delete(file_id, user_id)
+            self._remove_from_memory_index(str(user_id), file_id)
+            self._invalidate_file_info(file_id, user_id)
             logger.info(f"Successfully deleted file {file_id}")
-            return True
+            return file_info
         except Exception as e:
             logger.error(f"Error in delete_file: {str(e)}", exc_info=True)
             raise
 
+    def _invalidate_file_info(self, file_id: str, user_id: str):
+        """Drop any cached get_file_info result for a file."""
+        with self._file_info_lock:
+            self._file_info_cache.pop((file_id, str(user_id)), None)
+
     def get_file_info(self, file_id: str, user_id: str) -> Optional[Dict]:
         """Get information about a specific file.
         
+        Results are cached for FILE_INFO_CACHE_TTL seconds (not at all when it is 0).
+        
         Args:
             file_id: The file ID to look up
             user_id: The user ID who owns the file
@@ -230,6 +497,22 @@ class VectorStore:
         Returns:
             Dict containing file information or None if not found
         """
+        if FILE_INFO_CACHE_TTL <= 0:
+            return self._get_file_info_uncached(file_id, user_id)
+        key = (file_id, str(user_id))
+        with self._file_info_lock:
+            file_info = self._file_info_cache.get(key)
+        if file_info is not None:
+            logger.info(f"File info cache hit for file {file_id}")
+            return file_info
+        file_info = self._get_file_info_uncached(file_id, user_id)
+        if file_info is not None:
+            with self._file_info_lock:
+                self._file_info_cache[key] = file_info
+        return file_info
+
+    def _get_file_info_uncached(self, file_id: str, user_id: str) -> Optional[Dict]:
+        """Look up file information from chunk metadata in ChromaDB."""
         try:
             logger.info(f"Getting info for file {file_id} for user {user_id}")
             # Get the first chunk's metadata for this file
@@ -32,21 +32,28 @@ const ChatPanel = ({ selectedDocument, userId }) => {
     setMessages(prev => [...prev, { type: 'user', content: userMessage }]);
     setIsLoading(true);
 
+    // Add the AI message on the first streamed update, then keep replacing it
+    let started = false;
+    const updateAnswer = (partial) => {
+      const replace = started;
+      started = true;
+      const message = {
+        type: 'ai',
+        content: partial.answer,
+        sources: partial.sources
+      };
+      setMessages(prev => replace ? [...prev.slice(0, -1), message] : [...prev, message]);
+    };
+
     try {
       const response = await askQuestion(
         userMessage,
         userId,
-        selectedDocument?.file_id
+        selectedDocument?.file_id,
+        updateAnswer
       );
 
-      setMessages(prev => [
-        ...prev,
-        {
-          type: 'ai',
-          content: response.answer,
-          sources: response.sources
-        }
-      ]);
+      updateAnswer(response);
     } catch (error) {
       console.error('Error getting response:', error);
       setMessages(prev => [
@@ -47,7 +47,7 @@ export const deleteDocument = async (fileId, userId) => {
   }
 };
 
-export const askQuestion = async (text, userId, fileId = null) => {
+export const askQuestion = async (text, userId, fileId = null, onUpdate = () => {}) => {
   try {
     const response = await fetch(`${API_BASE_URL}/ask/`, {
       method: 'POST',
@@ -65,7 +65,37 @@ export const askQuestion = async (text, userId, fileId = null) => {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
 
-    return await response.json();
+    // The answer is streamed as server-sent events: sources first, then answer deltas
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const result = { answer: '', sources: [] };
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+
+      for (const event of events) {
+        if (!event.startsWith('data: ')) continue;
+        const data = JSON.parse(event.slice(6));
+        if (data.error) {
+          throw new Error(data.error);
+        }
+        if (data.sources) {
+          result.sources = data.sources;
+        }
+        if (data.delta) {
+          result.answer += data.delta;
+        }
+        onUpdate({ ...result });
+      }
+    }
+
+    return result;
   } catch (error) {
     console.error('Error asking question:', error);
     throw error;